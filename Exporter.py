@@ -0,0 +1,163 @@
+"""
+Export annotated frames [tracking overlays, measurement lines] to a video file
+"""
+
+import os
+import queue
+import threading
+from typing import Dict, List, Sequence, Tuple, Union
+import cv2
+import numpy as np
+
+# BGR values for the line colours offered in the GUI
+COLORS = {
+    'white': (255, 255, 255),
+    'red': (0, 0, 255),
+    'green': (0, 255, 0),
+    'blue': (255, 0, 0),
+    'yellow': (0, 255, 255),
+}
+
+
+def fit_scale(width: int, height: int, max_width: int = 3840, max_height: int = 2160) -> float:
+    """
+    Scale factor (at most 1) that brings a width x height frame within the
+    given limits, keeping it well inside what common encoders accept.
+    """
+    return min(1.0, max_width / width, max_height / height)
+
+
+def render_overlays(frame: np.ndarray,
+                    bounding_box: Union[Sequence[float], None] = None,
+                    com_path: Union[Sequence[Tuple[float, float]], None] = None,
+                    velocity_text: Union[str, None] = None,
+                    lines: Union[List[Dict], None] = None,
+                    box_color: str = 'green', path_color: str = 'red', scale: float = 1.0) -> np.ndarray:
+    """
+    Draw tracking and measurement overlays onto a copy of a frame.
+
+    bounding_box is (x, y, w, h), com_path a list of (x, y) points and lines
+    a list of dicts with 'start', 'end', 'color' and optionally 'label', all
+    in pixel coordinates of the original image. scale maps them onto frame,
+    for when frame is a resized copy of that image.
+    """
+    out = frame.copy()
+    if out.ndim == 2:
+        out = cv2.cvtColor(out, cv2.COLOR_GRAY2BGR)
+
+    thickness = max(2, out.shape[1] // 800)
+    font_scale = max(0.6, out.shape[1] / 1600)
+
+    for line in lines or []:
+        color = COLORS.get(line.get('color'), COLORS['white'])
+        start = tuple(int(round(v * scale)) for v in line['start'])
+        end = tuple(int(round(v * scale)) for v in line['end'])
+        cv2.line(out, start, end, color, thickness, cv2.LINE_AA)
+        if line.get('label'):
+            mid = ((start[0] + end[0]) // 2, (start[1] + end[1]) // 2 - 2 * thickness)
+            cv2.putText(out, line['label'], mid, cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness, cv2.LINE_AA)
+
+    if com_path is not None and len(com_path) > 1:
+        pts = np.int32(np.round(np.float64(com_path) * scale)).reshape(-1, 1, 2)
+        cv2.polylines(out, [pts], False, COLORS[path_color], thickness, cv2.LINE_AA)
+
+    if bounding_box is not None:
+        x, y, w, h = (int(round(v * scale)) for v in bounding_box)
+        cv2.rectangle(out, (x, y), (x + w, y + h), COLORS[box_color], thickness)
+
+    if velocity_text:
+        (text_w, text_h), baseline = cv2.getTextSize(velocity_text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+        origin = (10, 10 + text_h)
+        cv2.rectangle(out, (5, 5), (15 + text_w, 15 + text_h + baseline), (0, 0, 0), -1)
+        cv2.putText(out, velocity_text, origin, cv2.FONT_HERSHEY_SIMPLEX, font_scale,
+                    COLORS['white'], thickness, cv2.LINE_AA)
+
+    return out
+
+
+class VideoExporter(object):
+    '''
+        Writes frames to a video file on a background encoder thread.
+
+        Frames are handed over through a bounded queue, so a producer that
+        renders faster than the encoder blocks instead of buffering the
+        whole clip in memory.
+    '''
+    def __init__(self, filepath: str, fps: float, queue_size: int = 32, fourcc: str = 'mp4v'):
+        self.filepath = filepath
+        self.fps = fps if fps else 30.0
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+
+        self.frames_written = 0
+        self.error = None
+
+        self.__queue = queue.Queue(maxsize=queue_size)
+        self.__thread = None
+        self.__size = None
+
+    def start(self) -> 'VideoExporter':
+        '''
+        Start the encoder thread.
+        '''
+        self.__thread = threading.Thread(target=self._encode_loop, daemon=True)
+        self.__thread.start()
+        return self
+
+    def write(self, frame: np.ndarray) -> None:
+        '''
+        Queue a frame for encoding, blocking while the queue is full.
+        '''
+        assert self.__thread is not None, "Exporter not started"
+        if self.error is not None:
+            raise RuntimeError(f"Video export failed: {self.error}")
+        self.__queue.put(frame)
+
+    def close(self) -> int:
+        '''
+        Flush the remaining frames, stop the encoder and return the number
+        of frames written.
+        '''
+        if self.__thread is not None:
+            self.__queue.put(None)
+            self.__thread.join()
+            self.__thread = None
+        if self.error is not None:
+            raise RuntimeError(f"Video export failed: {self.error}")
+        return self.frames_written
+
+    def _encode_loop(self) -> None:
+        '''
+        Encoder thread: pull frames off the queue until the end sentinel.
+        '''
+        writer = None
+        try:
+            while True:
+                frame = self.__queue.get()
+                if frame is None:
+                    break
+
+                if writer is None:
+                    # The first frame fixes the output size
+                    self.__size = (frame.shape[1], frame.shape[0])
+                    writer = cv2.VideoWriter(self.filepath, self.fourcc, self.fps, self.__size)
+                    if not writer.isOpened():
+                        raise IOError(f"could not open {self.filepath} for writing")
+
+                if (frame.shape[1], frame.shape[0]) != self.__size:
+                    frame = cv2.resize(frame, self.__size)
+                writer.write(frame)
+                self.frames_written += 1
+        except Exception as e:
+            self.error = e
+            # Keep draining so a blocked producer can finish and see the error
+            while self.__queue.get() is not None:
+                pass
+        finally:
+            if writer is not None:
+                writer.release()
+
+        # VideoWriter.write does not report failures; an encoder that
+        # rejected the frames leaves an empty (or missing) file behind
+        if self.error is None and self.frames_written and \
+                (not os.path.exists(self.filepath) or os.path.getsize(self.filepath) == 0):
+            self.error = IOError(f"encoder produced no output for {self.filepath}")
@@ -16,6 +16,7 @@ from icon import icon_PVMAT
 from fractions import Fraction
 from PIL import ImageTk, Image, ImageDraw
 from Stitcher import Stitcher
+from Exporter import VideoExporter, fit_scale, render_overlays
 from typing import Callable, List, Tuple, Union
 
 # Set appearance mode and color theme
@@ -83,6 +84,14 @@ class PVMATApp(ctk.CTk):
         self.vel_units_ratio = -1
         self.velocity_units = 'km/h'
         
+        # Mapping from displayed canvas coordinates back to panorama pixels
+        self.display_scale = 1.0
+        self.display_offset = (0, 0)
+        self.exporting = False
+        
+        # Stitcher of a running Watch Folder session
+        self.live_stitcher = None
+        
         # Create the UI
         self.create_widgets()
         
@@ -103,6 +112,10 @@ class PVMATApp(ctk.CTk):
         self.file_path_label = ctk.CTkLabel(self.top_frame, text="No file selected")
         self.file_path_label.pack(side="left", padx=10)
         
+        # Live stitching from a folder being filled by a recorder
+        self.live_button = ctk.CTkButton(self.top_frame, text="Watch Folder", command=self.toggle_live)
+        self.live_button.pack(side="left", padx=5)
+        
         # Help button
         self.help_button = ctk.CTkButton(self.top_frame, text="Help", command=self.show_help)
         self.help_button.pack(side="right", padx=10)
@@ -122,6 +135,7 @@ class PVMATApp(ctk.CTk):
         self.canvas.bind("<B1-Motion>", self.on_canvas_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_canvas_release)
         self.canvas.bind("<Motion>", self.on_canvas_motion)
+        self.canvas.bind("<Configure>", self.on_canvas_resize)
         
         # Left sidebar - Tools
         self.left_frame = ctk.CTkFrame(self)
@@ -174,6 +188,9 @@ class PVMATApp(ctk.CTk):
         self.calibrate_button = ctk.CTkButton(self.right_frame, text="Calibrate Distance", command=self.calibrate_distance)
         self.calibrate_button.pack(pady=10)
         
+        self.export_button = ctk.CTkButton(self.right_frame, text="Export Video", command=self.export_video)
+        self.export_button.pack(pady=10)
+        
         # Playback controls
         self.playback_label = ctk.CTkLabel(self.right_frame, text="Playback", font=ctk.CTkFont(size=14, weight="bold"))
         self.playback_label.pack(pady=10)
@@ -244,24 +261,27 @@ class PVMATApp(ctk.CTk):
         try:
             # Initialize stitcher
             self.stitcher = Stitcher(self)
+            self.stitcher.set_preview_size(self.canvas.winfo_width(), self.canvas.winfo_height())
+            self._set_stitching(True)
             
             # Process video in a separate thread
-            thread = threading.Thread(target=self._process_video_thread)
+            thread = threading.Thread(target=self._process_video_thread, args=(self.stitcher, self.video_path))
             thread.daemon = True
             thread.start()
             
         except Exception as e:
+            self._set_stitching(False)
             messagebox.showerror("Error", f"Failed to process video: {str(e)}")
             self.status_label.configure(text="Error processing video")
     
-    def _process_video_thread(self):
+    def _process_video_thread(self, stitcher, video_path):
         """Thread function for video processing"""
         try:
             # Stitch the panorama
-            self.panorama = self.stitcher.stitch(self.video_path)
+            self.panorama = stitcher.stitch(video_path)
             
             # Get video info
-            cap = cv2.VideoCapture(self.video_path)
+            cap = cv2.VideoCapture(video_path)
             self.num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
             self.fps = cap.get(cv2.CAP_PROP_FPS)
             cap.release()
@@ -272,8 +292,64 @@ class PVMATApp(ctk.CTk):
         except Exception as e:
             self.after(0, lambda error_msg=e: self._on_video_error(error_msg))
     
+    def toggle_live(self):
+        """Start live stitching from a watched folder, or stop the running one"""
+        if self.live_stitcher is not None:
+            self.live_stitcher.stop_live()
+            self.status_label.configure(text="Stopping live stitching...")
+            return
+        
+        dir_path = filedialog.askdirectory(title="Select Folder to Watch")
+        if not dir_path:
+            return
+        
+        self.video_path = None
+        self.file_path_label.configure(text=f"Watching: {dir_path.split('/')[-1]}")
+        self.status_label.configure(text="Live stitching - waiting for frames...")
+        
+        self.stitcher = self.live_stitcher = Stitcher(self)
+        self.live_stitcher.set_preview_size(self.canvas.winfo_width(), self.canvas.winfo_height())
+        self._set_stitching(True, live=True)
+        
+        thread = threading.Thread(target=self._live_thread, args=(self.live_stitcher, dir_path))
+        thread.daemon = True
+        thread.start()
+    
+    def _live_thread(self, stitcher, dir_path):
+        """Thread function for live stitching"""
+        try:
+            self.panorama = stitcher.stitch_directory(dir_path)
+            self.num_frames = len(stitcher.frame_dump)
+            self.fps = stitcher.get_fps()
+            self.after(0, self._on_video_processed)
+            
+        except Exception as e:
+            self.after(0, lambda error_msg=e: self._on_video_error(error_msg))
+    
+    def _set_stitching(self, active, live=False):
+        """Lock the video sources while a stitch runs so only one stitcher is ever active"""
+        state = "disabled" if active else "normal"
+        self.file_button.configure(state=state)
+        if live:
+            self.live_button.configure(text="Stop Live")
+        else:
+            self.live_button.configure(text="Watch Folder", state=state)
+            self.live_stitcher = None
+    
+    def on_canvas_resize(self, event):
+        """Keep live previews sized to the canvas"""
+        if self.stitcher is not None:
+            self.stitcher.set_preview_size(event.width, event.height)
+    
+    def show_live_preview(self, preview, panorama_width):
+        """Show an intermediate panorama, already shrunk to the canvas by the stitcher"""
+        self._show_image(preview, source_width=panorama_width)
+        if self.stitcher is not None:
+            self.status_label.configure(text=f"Stitching... {len(self.stitcher.frame_dump)} frames")
+    
     def _on_video_processed(self):
         """Called when video processing is complete"""
+        self._set_stitching(False)
         self.status_label.configure(text="Video processed successfully")
         self.current_frame_num = 1
         self.update_frame_display()
@@ -281,6 +357,7 @@ class PVMATApp(ctk.CTk):
     
     def _on_video_error(self, error_msg):
         """Called when video processing fails"""
+        self._set_stitching(False)
         messagebox.showerror("Error", f"Failed to process video: {error_msg}")
         self.status_label.configure(text="Error processing video")
     
@@ -292,28 +369,42 @@ class PVMATApp(ctk.CTk):
         # For now, just display the panorama
         # In a full implementation, you'd display the current frame
         if hasattr(self.panorama, 'shape'):
-            # Convert numpy array to PIL Image
-            if len(self.panorama.shape) == 3:
-                image = Image.fromarray(cv2.cvtColor(self.panorama, cv2.COLOR_BGR2RGB))
-            else:
-                image = Image.fromarray(self.panorama)
-            
-            # Resize to fit canvas
-            canvas_width = self.canvas.winfo_width()
-            canvas_height = self.canvas.winfo_height()
-            
-            if canvas_width > 1 and canvas_height > 1:
-                image.thumbnail((canvas_width, canvas_height), Image.Resampling.LANCZOS)
-                
-                # Convert to PhotoImage
-                self.current_frame = ImageTk.PhotoImage(image)
-                
-                # Clear canvas and display image
-                self.canvas.delete("all")
-                self.canvas.create_image(
-                    canvas_width // 2, canvas_height // 2,
-                    image=self.current_frame, anchor="center"
-                )
+            self._show_image(self.panorama)
+    
+    def _show_image(self, array, source_width=None):
+        """
+        Fit a BGR or grayscale array to the canvas and display it, returning the shown PIL image.
+        source_width is the full-resolution panorama width when array is a shrunk copy of it.
+        """
+        # Convert numpy array to PIL Image
+        if len(array.shape) == 3:
+            image = Image.fromarray(cv2.cvtColor(array, cv2.COLOR_BGR2RGB))
+        else:
+            image = Image.fromarray(array)
+        
+        # Resize to fit canvas
+        canvas_width = self.canvas.winfo_width()
+        canvas_height = self.canvas.winfo_height()
+        
+        if canvas_width <= 1 or canvas_height <= 1:
+            return None
+        image.thumbnail((canvas_width, canvas_height), Image.Resampling.LANCZOS)
+        
+        # Remember how the panorama maps onto the canvas
+        self.display_scale = image.width / (source_width or array.shape[1])
+        self.display_offset = (canvas_width // 2 - image.width // 2,
+                               canvas_height // 2 - image.height // 2)
+        
+        # Convert to PhotoImage
+        self.current_frame = ImageTk.PhotoImage(image)
+        
+        # Clear canvas and display image
+        self.canvas.delete("all")
+        self.canvas.create_image(
+            canvas_width // 2, canvas_height // 2,
+            image=self.current_frame, anchor="center"
+        )
+        return image
     
     def enable_controls(self):
         """Enable all the control buttons"""
@@ -334,6 +425,101 @@ class PVMATApp(ctk.CTk):
         self.status_label.configure(text="Distance calibration not implemented yet")
         messagebox.showinfo("Info", "Distance calibration feature will be implemented in the next version")
     
+    def export_video(self):
+        """Export the panorama with tracking overlays and measurement lines to a video file"""
+        if self.panorama is None:
+            messagebox.showinfo("Info", "Please process a video before exporting")
+            return
+        if self.exporting:
+            return
+        
+        file_path = filedialog.asksaveasfilename(
+            title="Export Annotated Video",
+            defaultextension=".mp4",
+            filetypes=[("MP4 video", "*.mp4"), ("AVI video", "*.avi")]
+        )
+        if not file_path:
+            return
+        
+        # Snapshot everything the render thread needs while on the UI thread
+        lines = []
+        for line in self.Lines.values():
+            lines.append({
+                'start': line['pano_start'],
+                'end': line['pano_end'],
+                'color': line['color'],
+                'label': f"{line['pano_distance']:.1f} {self.distance_units}",
+            })
+        options = {
+            'panorama': self.panorama,
+            'lines': lines,
+            'fps': self.fps,
+            'bounding_boxes': list(self.bounding_boxes) if self.show_box_var.get() else [],
+            'COM_points': list(self.COM_points) if self.show_path_var.get() else [],
+            'velocities': list(self.velocities) if self.show_velocity_var.get() else [],
+        }
+        
+        self.exporting = True
+        self.export_button.configure(state="disabled")
+        self.status_label.configure(text="Exporting video...")
+        
+        thread = threading.Thread(target=self._export_video_thread, args=(file_path, options))
+        thread.daemon = True
+        thread.start()
+    
+    def _export_video_thread(self, file_path, options):
+        """Thread function for rendering frames and feeding the encoder"""
+        exporter = VideoExporter(file_path, options['fps']).start()
+        try:
+            # Shrink the panorama once to a size the encoder accepts (even
+            # dimensions, at most 4K); overlays are scaled to match
+            panorama = options['panorama']
+            height, width = panorama.shape[:2]
+            scale = fit_scale(width, height)
+            size = (max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2))
+            scale = size[0] / width
+            if size != (width, height):
+                panorama = cv2.resize(panorama, size, interpolation=cv2.INTER_AREA)
+            
+            # One frame per tracked frame; without tracking data the
+            # annotated panorama is held for one second
+            num_frames = max(len(options['bounding_boxes']), len(options['COM_points']), len(options['velocities']))
+            if num_frames == 0:
+                num_frames = max(1, int(round(options['fps'] or 30)))
+            
+            for i in range(num_frames):
+                box = options['bounding_boxes'][i] if i < len(options['bounding_boxes']) else None
+                path = options['COM_points'][:i + 1]
+                velocity = None
+                if i < len(options['velocities']):
+                    velocity = f"{options['velocities'][i]:.1f} {self.velocity_units}"
+                
+                frame = render_overlays(panorama, bounding_box=box, com_path=path,
+                                        velocity_text=velocity, lines=options['lines'], scale=scale)
+                exporter.write(frame)
+                
+                if i % 25 == 0:
+                    self.after(0, lambda n=i: self.status_label.configure(
+                        text=f"Exporting video... {n + 1}/{num_frames}"))
+            
+            written = exporter.close()
+            self.after(0, lambda: self._on_export_done(f"Exported {written} frames to {file_path.split('/')[-1]}"))
+            
+        except Exception as e:
+            try:
+                exporter.close()
+            except Exception:
+                pass
+            self.after(0, lambda error_msg=e: self._on_export_done(f"Export failed: {error_msg}", error=True))
+    
+    def _on_export_done(self, message, error=False):
+        """Called when the export thread finishes"""
+        self.exporting = False
+        self.export_button.configure(state="normal")
+        self.status_label.configure(text=message)
+        if error:
+            messagebox.showerror("Error", message)
+    
     def toggle_play(self):
         """Toggle play/pause"""
         self.play = not self.play
@@ -430,12 +616,17 @@ class PVMATApp(ctk.CTk):
             distance = np.sqrt((self.end_point[0] - self.start_point[0])**2 + 
                              (self.end_point[1] - self.start_point[1])**2)
             
-            # Store line data
+            # Store line data, also in panorama pixels using the mapping shown right now
+            pano_start = self.canvas_to_panorama(*self.start_point)
+            pano_end = self.canvas_to_panorama(*self.end_point)
             self.Lines[line_id] = {
                 'start': self.start_point,
                 'end': self.end_point,
                 'distance': distance,
-                'color': self.color_var.get()
+                'color': self.color_var.get(),
+                'pano_start': pano_start,
+                'pano_end': pano_end,
+                'pano_distance': distance / self.display_scale,
             }
             
             self.status_label.configure(text=f"Line drawn - Distance: {distance:.1f} pixels")
@@ -445,6 +636,11 @@ class PVMATApp(ctk.CTk):
             self.start_point = None
             self.end_point = None
     
+    def canvas_to_panorama(self, x, y):
+        """Convert a canvas position to panorama pixel coordinates"""
+        off_x, off_y = self.display_offset
+        return ((x - off_x) / self.display_scale, (y - off_y) / self.display_scale)
+    
     def on_canvas_motion(self, event):
         """Handle canvas motion events"""
         # Update cursor based on tool
@@ -506,7 +702,8 @@ PV-MAT - Panoramic Video Measurement and Tracking
 
 Instructions:
 1. Click 'Browse' to select a video file
-2. Wait for the video to be processed
+2. Wait for the video to be processed (the panorama grows as it is stitched)
+   - Or click 'Watch Folder' to stitch frames live as a recorder saves them
 3. Use the distance tools to measure objects:
    - Draw Line: Click and drag to draw measurement lines
    - Select Line: Click on lines to select them
@@ -514,6 +711,7 @@ Instructions:
 4. Use Track Object to track moving objects
 5. Use Calibrate Distance to set real-world measurements
 6. Use playback controls to navigate through frames
+7. Use Export Video to save the panorama with overlays to a video file
 
 Tips:
 - Keep videos short (6-10 seconds) for best results
@@ -3,7 +3,9 @@ Stitch together a panorama from a given video [input]
 """
 
 import os
-from typing import Tuple, Union
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Union
 import cv2
 import numpy as np
 import glob
@@ -12,7 +14,9 @@ class Stitcher(object):
     '''
         A Stitcher object for creating panoramas from videos.
     '''
-    def __init__(self, window=None, max_match: int = 100, focal_length: int = 3200, resize_factor: int = 1):
+    def __init__(self, window=None, max_match: int = 100, focal_length: int = 3200, resize_factor: int = 1,
+                 hierarchical: bool = False, segment_size: int = 32, workers: Union[int, None] = None,
+                 auto_focal: bool = False):
         self.orb = cv2.ORB_create() # ORB (Oriented FAST and Rotated BRIEF) a key-point detector
                                     # and desciptor to desctibe the overlap between frames
         self.panorama_frames = []
@@ -30,10 +34,37 @@ class Stitcher(object):
 
         self.f = focal_length
 
+        # Automatic focal-length estimation
+        self.auto_focal = auto_focal
+        self.focal_candidates = 12
+        self.focal_search_levels = 3
+        self.focal_pairs = 6
+        self.focal_pair_gap = 5
+        self.focal_warmup = 10 # raw frames buffered to estimate f before projecting the rest
+        self.focal_min_motion = 3.0 # median feature motion (px) below which f is left unchanged
+        self.focal_flat_tol = 0.05  # relative score spread below which f is left unchanged
+
         self.__pano = None
 
+        self.__maps = {}     # cylindrical remap tables keyed by (width, height, f)
+        self.__features = {} # raw-frame ORB features keyed by id(frame)
+
+        # Incremental (live) stitching
+        self.preview_interval = 0.5 # seconds between preview updates sent to the window
+        self.preview_size = None    # (width, height) previews are shrunk to fit, if set
+        self.max_read_attempts = 3  # times an unreadable file is retried by stitch_directory
+        self.__live = None
+        self.__stop_live = False
+
         self.window = window
 
+        # Hierarchical (divide-and-conquer) stitching: frames are split into
+        # segments stitched independently, then placed by a global solve
+        self.hierarchical = hierarchical
+        self.segment_size = segment_size
+        self.workers = workers if workers else (os.cpu_count() or 1)
+        self.link_span = 2 # segments this far apart are linked in the global solve if they overlap
+
     def set_window(self, window):
         '''
         Set the window after creation.
@@ -47,97 +78,695 @@ class Stitcher(object):
         self.__filepath = filepath
         
         try:
-            # Extract frames from video
-            self.extract_frames()
-            
-            # Create panorama from extracted frames
-            panorama = self.create_panorama()
-            
-            return panorama
+            if self.hierarchical:
+                # Stream frames straight into segments, then divide and conquer
+                self.reset_stitcher()
+                vid_cap = cv2.VideoCapture(filepath)
+                self.FPS = vid_cap.get(cv2.CAP_PROP_FPS)
+                try:
+                    return self.create_panorama_hierarchical(self._projected_frames(vid_cap))
+                finally:
+                    vid_cap.release()
+
+            # Otherwise feed the file through the incremental API
+            vid_cap = cv2.VideoCapture(filepath)
+            self.FPS = vid_cap.get(cv2.CAP_PROP_FPS)
+            try:
+                return self.stitch_capture(vid_cap, max_frames=50)  # Limit to 50 frames for now
+            finally:
+                vid_cap.release()
             
         except Exception as e:
             print(f"Error in stitching: {e}")
             return None
 
-    def extract_frames(self) -> None:
+    def _projected_frames(self, vid_cap: cv2.VideoCapture, max_frames: Union[int, None] = None):
         """
-        Extract frames from the video stream (simplified version)
+        Read frames from a capture and yield them cylindrically projected, as
+        they are read. With auto_focal only the first focal_warmup raw frames
+        are held back, to estimate f before anything is projected.
         """
-        assert self.__filepath is not None, "No filepath provided"
-
-        vid_cap = cv2.VideoCapture(self.__filepath)
-        total_frames = int(vid_cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        self.FPS = vid_cap.get(cv2.CAP_PROP_FPS)
-
-        # Read first frame
-        success, last = vid_cap.read()
-        assert success, "couldn't read first frame"
-        
-        # Apply cylindrical projection
-        last = self.cylindrical_project(last)
-        
-        # Save first frame
-        self.frame_dump.append(last)
-        self.panorama_frames.append(last)
-
-        # Read and process remaining frames
-        frame_num = 1
-        while True:
+        warmup = [] if self.auto_focal else None
+        frame_num = 0
+        while not max_frames or frame_num < max_frames:
             success, image = vid_cap.read()
             if not success:
                 break
-                
-            # Apply cylindrical projection
-            image = self.cylindrical_project(image)
-            
-            # Save frame
-            self.frame_dump.append(image)
-            self.panorama_frames.append(image)
-            
             frame_num += 1
-            
-            # Limit frames for performance
-            if frame_num >= 50:  # Limit to 50 frames for now
-                break
 
-        vid_cap.release()
+            if warmup is None:
+                # Apply cylindrical projection
+                yield self.cylindrical_project(image)
+                continue
+
+            warmup.append(image)
+            if len(warmup) >= self.focal_warmup:
+                # Enough sample frames: pick the focal length, then flush the sample
+                yield from self._calibrate_and_project(warmup)
+                warmup = None
+
+        if warmup:
+            # Clip shorter than the warm-up: estimate from what there is
+            yield from self._calibrate_and_project(warmup)
 
-    def cylindrical_project(self, img: np.ndarray) -> np.ndarray:
+    def _calibrate_and_project(self, raw_frames: list):
+        """
+        Estimate f from a sample of raw frames, then yield them projected.
+        """
+        if len(raw_frames) > 1:
+            self.f = self.estimate_focal_length(raw_frames)
+        for raw in raw_frames:
+            yield self.cylindrical_project(raw)
+
+    def cylindrical_project(self, img: np.ndarray, f: Union[float, None] = None) -> np.ndarray:
         """
         Apply cylindrical projection to an image.
         """
-        # Simplified cylindrical projection
         height, width = img.shape[:2]
-        
-        # Create cylindrical projection matrix
-        center_x, center_y = width // 2, height // 2
-        
-        # For now, just return the original image
-        # In a full implementation, this would apply the cylindrical transformation
-        return img
+        map_x, map_y = self._cylindrical_maps(width, height, f if f else self.f)
+        return cv2.remap(img, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+
+    def _cylindrical_maps(self, width: int, height: int, f: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get (cached) remap tables for projecting a width x height image onto a
+        cylinder of radius f.
+        """
+        key = (width, height, float(f))
+        maps = self.__maps.get(key)
+        if maps is None:
+            center_x, center_y = width / 2, height / 2
+            xs, ys = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+            theta = (xs - center_x) / f
+            map_x = (f * np.tan(theta) + center_x).astype(np.float32)
+            map_y = ((ys - center_y) / np.cos(theta) + center_y).astype(np.float32)
+            maps = self.__maps[key] = (map_x, map_y)
+        return maps
+
+    def _projection_mask(self, width: int, height: int, f: Union[float, None] = None) -> np.ndarray:
+        """
+        Get (cached) uint8 mask of the pixels of a projected frame that were
+        sampled from inside the source frame, eroded by one pixel so the
+        interpolated black border is excluded.
+        """
+        f = f if f else self.f
+        key = (width, height, float(f), 'mask')
+        mask = self.__maps.get(key)
+        if mask is None:
+            map_x, map_y = self._cylindrical_maps(width, height, f)
+            mask = ((map_x >= 0) & (map_x <= width - 1) & (map_y >= 0) & (map_y <= height - 1)).astype(np.uint8)
+            mask[[0, -1], :] = 0
+            mask[:, [0, -1]] = 0
+            mask = self.__maps[key] = cv2.erode(mask, np.ones((3, 3), np.uint8))
+        return mask
+
+    @staticmethod
+    def _warp_with_mask(img: np.ndarray, mask: np.ndarray, M: np.ndarray,
+                        size: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Warp an image and its validity mask by M. The mask is warped with
+        nearest-neighbour sampling and eroded by a pixel, so it excludes
+        the edge where the image was interpolated against the background.
+        """
+        layer = cv2.warpPerspective(img, M, size)
+        layer_mask = cv2.warpPerspective(mask, M, size, flags=cv2.INTER_NEAREST)
+        return layer, cv2.erode(layer_mask, np.ones((3, 3), np.uint8))
+
+    @staticmethod
+    def _cylindrical_points(pts: np.ndarray, width: int, height: int, f: float) -> np.ndarray:
+        """
+        Forward-project image points onto the cylinder (the inverse of the
+        remap tables from _cylindrical_maps).
+        """
+        center_x, center_y = width / 2, height / 2
+        dx = pts[:, 0] - center_x
+        x = f * np.arctan(dx / f) + center_x
+        y = f * (pts[:, 1] - center_y) / np.sqrt(dx ** 2 + f ** 2) + center_y
+        return np.stack([x, y], axis=1)
+
+    def estimate_focal_length(self, frames: list, f_min: Union[float, None] = None,
+                              f_max: Union[float, None] = None) -> float:
+        """
+        Estimate the focal length (in pixels) from a small sample of frame pairs.
+
+        Features are detected and matched once on the raw frames. Each
+        candidate focal length then only projects the matched points onto the
+        cylinder and scores how far they are from a pure translation, which
+        is what a correct projection gives for a panning camera. Candidates
+        are scored in parallel and refined coarse-to-fine within
+        [f_min, f_max]. If the sample shows too little motion, or no candidate
+        fits clearly better than the others, the current f is kept.
+        """
+        height, width = frames[0].shape[:2]
+        f_min = f_min if f_min else 0.25 * width
+        f_max = f_max if f_max else 8.0 * width
+
+        # Only keep cached features of the frames passed in
+        self.__features = {key: entry for key, entry in self.__features.items()
+                           if any(entry[0] is frame for frame in frames)}
+
+        pairs = self._calibration_matches(frames)
+        if not pairs:
+            print("Not enough matches to estimate focal length, keeping f =", self.f)
+            return self.f
+
+        # Without camera motion every f fits equally well
+        motion = np.median([np.median(np.linalg.norm(pts_a - pts_b, axis=1)) for pts_a, pts_b in pairs])
+        if motion < self.focal_min_motion:
+            print("Too little camera motion to estimate focal length, keeping f =", self.f)
+            return self.f
+
+        def score(f: float) -> float:
+            residuals = []
+            for pts_a, pts_b in pairs:
+                cyl_a = self._cylindrical_points(pts_a, width, height, f)
+                cyl_b = self._cylindrical_points(pts_b, width, height, f)
+                d = cyl_a - cyl_b
+                shift = np.median(d, axis=0)
+                # Relative to the shift, i.e. in angular terms: a small f
+                # shrinks the cylinder, and with it residual and shift alike
+                residual = np.median(np.linalg.norm(d - shift, axis=1))
+                residuals.append(residual / max(np.linalg.norm(shift), 1e-6))
+            return float(np.mean(residuals))
+
+        lo_bound, hi_bound = np.log(f_min), np.log(f_max)
+        lo, hi = lo_bound, hi_bound
+        best = self.f
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for level in range(self.focal_search_levels):
+                candidates = np.exp(np.linspace(lo, hi, self.focal_candidates))
+                scores = list(pool.map(score, candidates))
+                i = int(np.argmin(scores))
+                # A flat curve, or a best fit on the edge of the range, means
+                # the sample does not pin f down
+                if level == 0 and (min(scores) > (1 - self.focal_flat_tol) * max(scores)
+                                   or i in (0, len(scores) - 1)):
+                    print("Focal length is not constrained by the sample, keeping f =", self.f)
+                    return self.f
+                best = float(candidates[i])
+                # Narrow the search to the neighbours of the best candidate
+                step = (hi - lo) / (self.focal_candidates - 1)
+                lo, hi = max(lo_bound, np.log(best) - step), min(hi_bound, np.log(best) + step)
+
+        return best
+
+    def _calibration_matches(self, frames: list) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Match features on a few evenly spaced frame pairs for focal-length
+        estimation. Features are cached per frame.
+        """
+        gap = min(self.focal_pair_gap, len(frames) - 1)
+        if gap < 1:
+            return []
+        starts = np.linspace(0, len(frames) - 1 - gap, min(self.focal_pairs, len(frames) - gap)).astype(int)
+
+        matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+        pairs = []
+        for i in sorted(set(starts)):
+            kp_a, des_a = self._frame_features(frames[i])
+            kp_b, des_b = self._frame_features(frames[i + gap])
+            if des_a is None or des_b is None:
+                continue
+            matches = sorted(matcher.match(des_a, des_b), key=lambda m: m.distance)[:self.max_match_num]
+            if len(matches) < self.min_match_num:
+                continue
+            pairs.append((kp_a[[m.queryIdx for m in matches]], kp_b[[m.trainIdx for m in matches]]))
+        return pairs
+
+    def _frame_features(self, frame: np.ndarray) -> Tuple[np.ndarray, Union[np.ndarray, None]]:
+        """
+        Get (cached) ORB keypoint coordinates and descriptors for a raw frame.
+        The cache is keyed by the frame object itself.
+        """
+        entry = self.__features.get(id(frame))
+        if entry is None or entry[0] is not frame:
+            kp, des = self.orb.detectAndCompute(self._to_gray(frame), None)
+            entry = self.__features[id(frame)] = (frame, np.float32([k.pt for k in kp]).reshape(-1, 2), des)
+        return entry[1], entry[2]
+
+    def create_panorama_hierarchical(self, frames=None) -> np.ndarray:
+        """
+        Create panorama by divide-and-conquer: stitch segments of frames in
+        parallel, register neighbouring segments through their boundary
+        frames, then solve for all segment placements at once.
+
+        frames may be any iterable of projected frames (panorama_frames by
+        default). Segments are handed to the workers as they fill up, so at
+        most segment_size * (workers + 1) frames are held in memory at once;
+        the frames are not kept in frame_dump.
+        """
+        frames = self.panorama_frames if frames is None else frames
+        size = max(2, self.segment_size)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # Leaf level: each segment is a short serial chain
+            results, pending, segment = [], [], []
+            for frame in frames:
+                segment.append(frame)
+                if len(segment) < size:
+                    continue
+                pending.append(pool.submit(self._stitch_chain, segment))
+                segment = []
+                if len(pending) >= self.workers:
+                    # Wait for the oldest segment before reading further
+                    results.append(pending.pop(0).result())
+            if segment:
+                pending.append(pool.submit(self._stitch_chain, segment))
+            results.extend(future.result() for future in pending)
+
+            if not results:
+                raise ValueError("No frames to stitch")
+            segment_panos = [pano for pano, _, _ in results]
+            segment_masks = [mask for _, mask, _ in results]
+            boundaries = [boundary for _, _, boundary in results]
+
+            placements = self._solve_placements(pool, boundaries)
+
+        panorama = self._render(segment_panos, segment_masks, list(enumerate(placements)))
+        self.__pano = panorama
+        return panorama
+
+    def _detect_features(self, img: np.ndarray) -> Tuple[np.ndarray, Union[np.ndarray, None]]:
+        """
+        Detect ORB keypoint coordinates and descriptors in an image.
+        """
+        # ORB detectors are not safe to share across worker threads
+        orb = cv2.ORB_create()
+        kp, des = orb.detectAndCompute(self._to_gray(img), None)
+        return np.float32([k.pt for k in kp]).reshape(-1, 2), des
+
+    def _match_features(self, feat_a: tuple, feat_b: tuple) -> Union[Tuple[np.ndarray, np.ndarray, np.ndarray], None]:
+        """
+        Fit the 3x3 similarity transform mapping image b onto image a with
+        RANSAC. Returns (H, inlier points in a, inlier points in b), or None
+        if fewer than min_match_num matches are RANSAC inliers.
+        """
+        (pts_a, des_a), (pts_b, des_b) = feat_a, feat_b
+        if des_a is None or des_b is None:
+            return None
+
+        matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+        matches = sorted(matcher.match(des_b, des_a), key=lambda m: m.distance)[:self.max_match_num]
+        if len(matches) < self.min_match_num:
+            return None
+
+        src = pts_b[[m.queryIdx for m in matches]]
+        dst = pts_a[[m.trainIdx for m in matches]]
+        M, inliers = cv2.estimateAffinePartial2D(src, dst, method=cv2.RANSAC)
+        if M is None or inliers is None or int(inliers.sum()) < self.min_match_num:
+            return None
+        keep = inliers.ravel().astype(bool)
+        return np.vstack([M, [0, 0, 1]]), dst[keep], src[keep]
+
+    def _stitch_chain(self, frames: list) -> Tuple[np.ndarray, np.ndarray, list]:
+        """
+        Stitch a short list of frames serially, each onto the growing panorama.
+        Returns the panorama, its validity mask and its boundary: [(first
+        frame, transform into the panorama), (last stitched frame, transform
+        into the panorama)].
+        """
+        frame_mask = self._projection_mask(frames[0].shape[1], frames[0].shape[0])
+        panorama, pano_mask = frames[0].copy(), frame_mask
+        panorama[frame_mask == 0] = 0
+        first_H = np.eye(3)
+        prev, prev_H = frames[0], np.eye(3)
+        prev_feat = self._detect_features(prev)
+        for frame in frames[1:]:
+            feat = self._detect_features(frame)
+            match = self._match_features(prev_feat, feat)
+            if match is None:
+                continue
+            H = prev_H @ match[0]
+            panorama, pano_mask, shift = self._composite(panorama, pano_mask, frame, frame_mask, H)
+            first_H, prev_H = shift @ first_H, shift @ H
+            prev, prev_feat = frame, feat
+        return panorama, pano_mask, [(frames[0], first_H), (prev, prev_H)]
 
-    def create_panorama(self) -> np.ndarray:
+    def _solve_placements(self, pool: ThreadPoolExecutor, boundaries: list) -> List[np.ndarray]:
         """
-        Create panorama from extracted frames.
+        Solve for every segment's similarity transform into the panorama by
+        linear least squares over feature correspondences between segment
+        boundary frames. The first segment is held fixed.
+
+        Adjacent segments are always linked through the last frame of one and
+        the first frame of the next. Boundary frames of segments up to
+        link_span apart are also linked wherever they overlap; these extra
+        constraints are what let the solve spread drift out instead of simply
+        chaining the pairwise transforms.
+        """
+        n = len(boundaries)
+        if n == 1:
+            return [np.eye(3)]
+
+        # Detect features once per boundary frame
+        frames = [frame for boundary in boundaries for frame, _ in boundary]
+        features = list(pool.map(self._detect_features, frames))
+
+        links = [(i, a, j, b) for i in range(n) for j in range(i + 1, min(n, i + 1 + self.link_span))
+                 for a in range(2) for b in range(2)]
+        matches = list(pool.map(lambda l: self._match_features(features[2 * l[0] + l[1]], features[2 * l[2] + l[3]]),
+                                links))
+
+        constraints = []
+        for (i, a, j, b), match in zip(links, matches):
+            if match is None:
+                if (j, a, b) != (i + 1, 1, 0):
+                    continue
+                # Adjacent segments failed to register: place the next
+                # segment's first frame directly to the right of the last one
+                h, w = boundaries[j][0][0].shape[:2]
+                pts_b = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+                pts_a = pts_b + np.float32([w, 0])
+            else:
+                _, pts_a, pts_b = match
+            # Express both sides in their segment panorama's coordinates
+            constraints.append((i, self._apply(boundaries[i][a][1], pts_a),
+                                j, self._apply(boundaries[j][b][1], pts_b)))
+
+        # Unknowns per segment k > 0: similarity [[p, -q, tx], [q, p, ty]],
+        # solved in units of the frame width for conditioning
+        scale = float(boundaries[0][0][0].shape[1])
+        rows, rhs = [], []
+        for i, pts_i, j, pts_j in constraints:
+            for k, pts, sign in ((i, pts_i / scale, 1.0), (j, pts_j / scale, -1.0)):
+                m = len(pts)
+                block = np.zeros((2 * m, 4 * (n - 1)))
+                if k == 0:
+                    # Fixed identity: its contribution moves to the right-hand side
+                    known = -sign * np.concatenate([pts[:, 0], pts[:, 1]])
+                else:
+                    c = 4 * (k - 1)
+                    block[:m, c:c + 4] = sign * np.column_stack([pts[:, 0], -pts[:, 1], np.ones(m), np.zeros(m)])
+                    block[m:, c:c + 4] = sign * np.column_stack([pts[:, 1], pts[:, 0], np.zeros(m), np.ones(m)])
+                    known = np.zeros(2 * m)
+                if sign > 0:
+                    rows.append(block)
+                    rhs.append(known)
+                else:
+                    rows[-1] = rows[-1] + block
+                    rhs[-1] = rhs[-1] + known
+
+        params = np.linalg.lstsq(np.vstack(rows), np.concatenate(rhs), rcond=None)[0]
+
+        placements = [np.eye(3)]
+        for k in range(1, n):
+            p, q, tx, ty = params[4 * (k - 1):4 * k]
+            placements.append(np.array([[p, -q, tx * scale], [q, p, ty * scale], [0, 0, 1]]))
+        return placements
+
+    @staticmethod
+    def _apply(H: np.ndarray, pts: np.ndarray) -> np.ndarray:
+        """Apply a 3x3 affine transform to an Nx2 array of points."""
+        return pts @ H[:2, :2].T + H[:2, 2]
+
+    def _composite(self, base: np.ndarray, base_mask: np.ndarray, img: np.ndarray, img_mask: np.ndarray,
+                   H: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Warp img by H onto an expanded copy of base, through the images'
+        validity masks. Returns the composite, its mask and the translation
+        applied to base's coordinates.
+        """
+        h_b, w_b = base.shape[:2]
+        h_i, w_i = img.shape[:2]
+        corners = np.float32([[0, 0], [w_i, 0], [w_i, h_i], [0, h_i]]).reshape(-1, 1, 2)
+        warped = cv2.perspectiveTransform(corners, H).reshape(-1, 2)
+        all_pts = np.vstack([warped, [[0, 0], [w_b, h_b]]])
+        x_min, y_min = np.floor(all_pts.min(axis=0)).astype(int)
+        x_max, y_max = np.ceil(all_pts.max(axis=0)).astype(int)
+
+        shift = np.array([[1, 0, -x_min], [0, 1, -y_min], [0, 0, 1]], dtype=np.float64)
+        out_size = (int(x_max - x_min), int(y_max - y_min))
+
+        # base only moves by a whole-pixel offset: copy it instead of resampling
+        canvas = np.zeros((out_size[1], out_size[0]) + base.shape[2:], dtype=base.dtype)
+        canvas_mask = np.zeros((out_size[1], out_size[0]), dtype=np.uint8)
+        canvas[-y_min:-y_min + h_b, -x_min:-x_min + w_b] = base
+        canvas_mask[-y_min:-y_min + h_b, -x_min:-x_min + w_b] = base_mask
+
+        layer, layer_mask = self._warp_with_mask(img, img_mask, shift @ H, out_size)
+        valid = layer_mask > 0
+        canvas[valid] = layer[valid]
+        canvas_mask[valid] = 1
+        return canvas, canvas_mask, shift
+
+    def _render(self, images: list, masks: list, placements: List[Tuple[int, np.ndarray]]) -> np.ndarray:
+        """
+        Render images into a single canvas given their validity masks and
+        (index, 3x3 transform) placements.
+        """
+        pts = []
+        for i, T in placements:
+            h, w = images[i].shape[:2]
+            corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+            pts.append(cv2.perspectiveTransform(corners, T).reshape(-1, 2))
+        pts = np.vstack(pts)
+        x_min, y_min = np.floor(pts.min(axis=0)).astype(int)
+        x_max, y_max = np.ceil(pts.max(axis=0)).astype(int)
+
+        shift = np.array([[1, 0, -x_min], [0, 1, -y_min], [0, 0, 1]], dtype=np.float64)
+        out_size = (int(x_max - x_min), int(y_max - y_min))
+
+        canvas = np.zeros((out_size[1], out_size[0]) + images[0].shape[2:], dtype=images[0].dtype)
+        for i, T in placements:
+            layer, layer_mask = self._warp_with_mask(images[i], masks[i], shift @ T, out_size)
+            valid = layer_mask > 0
+            canvas[valid] = layer[valid]
+        return canvas
+
+    @staticmethod
+    def _to_gray(img: np.ndarray) -> np.ndarray:
+        """Convert an image to grayscale if needed."""
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+    def start_live(self) -> None:
+        """
+        Begin an incremental stitch. Frames are then pushed with add_frame.
+        """
+        self.reset_stitcher()
+        self.__live = {
+            'canvas': None,        # growing panorama buffer
+            'origin': np.zeros(2), # position of the first frame's (0, 0) in the canvas
+            'bounds': None,        # used region of the canvas as [x0, y0, x1, y1]
+            'prev_feat': None,     # ORB features of the last stitched frame
+            'prev_H': np.eye(3),   # last stitched frame -> first frame coordinates
+            'warmup': [],          # raw frames held back while estimating f
+            'last_preview': 0.0,
+        }
+
+    def add_frame(self, frame: np.ndarray) -> bool:
+        """
+        Add one frame to the live panorama. Each frame is only matched against
+        the previous one and warped into its own region of the canvas, so the
+        cost per frame does not grow with the panorama.
+        Returns False if the frame could not be aligned and was skipped.
+        """
+        if self.__live is None:
+            self.start_live()
+        live = self.__live
+
+        if self.auto_focal and live['warmup'] is not None:
+            live['warmup'].append(frame)
+            if len(live['warmup']) < self.focal_warmup:
+                return True
+            self.f = self.estimate_focal_length(live['warmup'])
+            warmup, live['warmup'] = live['warmup'], None
+            return all([self.add_frame(raw) for raw in warmup])
+
+        image = self.cylindrical_project(frame)
+        self.frame_dump.append(image)
+        self.panorama_frames.append(image)
+
+        # Features of the previous frame are kept, so each frame costs one detection
+        feat = self._detect_features(image)
+        if live['prev_feat'] is None:
+            H = np.eye(3)
+        else:
+            match = self._match_features(live['prev_feat'], feat)
+            if match is None:
+                return False
+            H = live['prev_H'] @ match[0]
+
+        self._paste_live(image, H)
+        live['prev_feat'], live['prev_H'] = feat, H
+
+        now = time.monotonic()
+        if self.window is not None and now - live['last_preview'] >= self.preview_interval:
+            live['last_preview'] = now
+            x0, _, x1, _ = live['bounds']
+            self.window.after(0, self.window.show_live_preview, self._preview_image(), x1 - x0)
+        return True
+
+    def get_live_panorama(self) -> Union[np.ndarray, None]:
+        """
+        Get a copy of the live panorama so far.
+        """
+        if self.__live is None or self.__live['canvas'] is None:
+            return None
+        x0, y0, x1, y1 = self.__live['bounds']
+        return self.__live['canvas'][y0:y1, x0:x1].copy()
+
+    def finish_live(self) -> Union[np.ndarray, None]:
+        """
+        End the incremental stitch and return the final panorama.
         """
-        if not self.panorama_frames:
+        if self.__live is not None and self.__live['warmup']:
+            # Fewer frames than the warm-up needs: estimate from what arrived
+            warmup, self.__live['warmup'] = self.__live['warmup'], None
+            self.f = self.estimate_focal_length(warmup) if len(warmup) > 1 else self.f
+            for raw in warmup:
+                self.add_frame(raw)
+
+        panorama = self.get_live_panorama()
+        if panorama is None:
             raise ValueError("No frames to stitch")
-            
-        # For now, just return the first frame as a simple panorama
-        # In a full implementation, this would stitch multiple frames together
-        panorama = self.panorama_frames[0]
-        
-        # If we have multiple frames, try to stitch them
-        if len(self.panorama_frames) > 1:
-            try:
-                # Simple horizontal concatenation for demonstration
-                panorama = np.hstack(self.panorama_frames[:3])  # Use first 3 frames
-            except:
-                # If concatenation fails, use first frame
-                panorama = self.panorama_frames[0]
-        
+        self.__pano = panorama
+        self.__live = None
+        if self.window is not None:
+            self.window.after(0, self.window.show_live_preview, self._preview_image(panorama), panorama.shape[1])
         return panorama
 
+    def _preview_image(self, panorama: Union[np.ndarray, None] = None) -> np.ndarray:
+        """
+        Get the live panorama (or the given one) shrunk to fit preview_size,
+        so the window never has to handle the full-resolution panorama. The
+        window is sent the full width alongside, to map canvas positions.
+        """
+        if panorama is None:
+            x0, y0, x1, y1 = self.__live['bounds']
+            panorama = self.__live['canvas'][y0:y1, x0:x1]
+        h, w = panorama.shape[:2]
+        scale = 1.0
+        if self.preview_size:
+            scale = min(1.0, self.preview_size[0] / w, self.preview_size[1] / h)
+        if scale >= 1.0:
+            return panorama.copy()
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        return cv2.resize(panorama, size, interpolation=cv2.INTER_AREA)
+
+    def stop_live(self) -> None:
+        """
+        Ask a running stitch_capture / stitch_directory loop to stop. The
+        request holds until a loop consumes it, so it is not lost when made
+        before the loop has started.
+        """
+        self.__stop_live = True
+
+    def stitch_capture(self, vid_cap: cv2.VideoCapture, max_frames: Union[int, None] = None) -> Union[np.ndarray, None]:
+        """
+        Stitch frames from an open cv2.VideoCapture (file or live device)
+        until it runs dry, stop_live is called or max_frames is reached.
+        """
+        self.start_live()
+        frame_num = 0
+        while not self.__stop_live:
+            success, image = vid_cap.read()
+            if not success:
+                break
+            self.add_frame(image)
+            frame_num += 1
+            if max_frames and frame_num >= max_frames:
+                break
+        self.__stop_live = False
+        return self.finish_live()
+
+    def stitch_directory(self, dirpath: str, pattern: str = "*.jpg", poll_interval: float = 0.5,
+                         idle_timeout: float = 10.0) -> Union[np.ndarray, None]:
+        """
+        Stitch image files from a directory that a recorder is still writing
+        to. New files are picked up in name order once their size has stayed
+        the same for one poll; files that still fail to decode after
+        max_read_attempts are skipped. The stitch ends when nothing new
+        appears for idle_timeout seconds or stop_live is called.
+        """
+        self.start_live()
+        done = set()
+        sizes, attempts = {}, {}
+        last_new = time.monotonic()
+        while not self.__stop_live:
+            new_files = sorted(p for p in glob.glob(os.path.join(dirpath, pattern)) if p not in done)
+            # A file is ready once its size is unchanged since the last poll
+            ready = []
+            for path in new_files:
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    size = 0
+                if size != sizes.get(path):
+                    last_new = time.monotonic()
+                # A stable empty file is ready too: it fails to decode and
+                # goes through the retry limit like any unreadable file
+                ready.append(size == sizes.get(path))
+                sizes[path] = size
+
+            for path, is_ready in zip(new_files, ready):
+                if not is_ready:
+                    # Keep name order: wait for this file before later ones
+                    break
+
+                image = cv2.imread(path)
+                if image is None:
+                    attempts[path] = attempts.get(path, 0) + 1
+                    if attempts[path] < self.max_read_attempts:
+                        break
+                    print(f"Skipping unreadable file: {path}")
+                    done.add(path)
+                    continue
+
+                done.add(path)
+                last_new = time.monotonic()
+                self.add_frame(image)
+                if self.__stop_live:
+                    break
+
+            if time.monotonic() - last_new > idle_timeout:
+                break
+            time.sleep(poll_interval)
+        self.__stop_live = False
+        return self.finish_live()
+
+    def _paste_live(self, image: np.ndarray, H: np.ndarray) -> None:
+        """
+        Warp a frame into the live canvas, growing the canvas when needed.
+        """
+        live = self.__live
+        h, w = image.shape[:2]
+        corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+        warped = cv2.perspectiveTransform(corners, H).reshape(-1, 2) + live['origin']
+        x0, y0 = np.floor(warped.min(axis=0)).astype(int)
+        x1, y1 = np.ceil(warped.max(axis=0)).astype(int)
+
+        if live['canvas'] is None:
+            # Leave room to grow so the canvas is rarely reallocated
+            live['canvas'] = np.zeros((3 * h, 5 * w) + image.shape[2:], dtype=image.dtype)
+            live['origin'] = np.array([2 * w, h], dtype=np.float64)
+            live['bounds'] = [2 * w, h, 2 * w, h]
+            return self._paste_live(image, H)
+
+        canvas = live['canvas']
+        c_h, c_w = canvas.shape[:2]
+        if x0 < 0 or y0 < 0 or x1 > c_w or y1 > c_h:
+            # Grow by at least the frame size on each side that overflowed
+            pad_l = max(-x0, 2 * w) if x0 < 0 else 0
+            pad_t = max(-y0, h) if y0 < 0 else 0
+            pad_r = max(x1 - c_w, 2 * w) if x1 > c_w else 0
+            pad_b = max(y1 - c_h, h) if y1 > c_h else 0
+            grown = np.zeros((c_h + pad_t + pad_b, c_w + pad_l + pad_r) + canvas.shape[2:], dtype=canvas.dtype)
+            grown[pad_t:pad_t + c_h, pad_l:pad_l + c_w] = canvas
+            live['canvas'] = canvas = grown
+            live['origin'] = live['origin'] + [pad_l, pad_t]
+            b = live['bounds']
+            live['bounds'] = [b[0] + pad_l, b[1] + pad_t, b[2] + pad_l, b[3] + pad_t]
+            x0, x1, y0, y1 = x0 + pad_l, x1 + pad_l, y0 + pad_t, y1 + pad_t
+
+        # Only warp into the frame's own region of the canvas
+        to_roi = np.array([[1, 0, live['origin'][0] - x0], [0, 1, live['origin'][1] - y0], [0, 0, 1]])
+        mask = self._projection_mask(w, h)
+        layer, layer_mask = self._warp_with_mask(image, mask, to_roi @ H, (int(x1 - x0), int(y1 - y0)))
+        valid = layer_mask > 0
+        canvas[y0:y1, x0:x1][valid] = layer[valid]
+
+        b = live['bounds']
+        live['bounds'] = [min(b[0], x0), min(b[1], y0), max(b[2], x1), max(b[3], y1)]
+
     def get_fps(self) -> float:
         """
         Get the FPS of the video.
@@ -172,6 +801,24 @@ class Stitcher(object):
         """Set focal length."""
         self.f = f
 
+    def set_preview_size(self, width: int, height: int):
+        """Set the size live previews are shrunk to fit."""
+        self.preview_size = (width, height)
+
+    def set_auto_focal(self, enabled: bool):
+        """Enable or disable automatic focal-length estimation."""
+        self.auto_focal = enabled
+
+    def set_hierarchical(self, enabled: bool, segment_size: Union[int, None] = None):
+        """Enable or disable hierarchical stitching."""
+        self.hierarchical = enabled
+        if segment_size:
+            self.segment_size = segment_size
+
+    def set_workers(self, workers: int):
+        """Set number of parallel workers for hierarchical stitching."""
+        self.workers = max(1, workers)
+
     def set_resize_factor(self, factor: int):
         """Set resize factor."""
         self.__resize = factor
@@ -185,3 +832,4 @@ class Stitcher(object):
         self.panorama_frames = []
         self.frame_dump = []
         self.__pano = None
+        self.__features = {}